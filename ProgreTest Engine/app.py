@@ -6,11 +6,37 @@ An LLM-powered adaptive assessment system that generates questions from PDFs,
 adjusts difficulty based on performance, and generates detailed reports.
 """
 
+import hashlib
+import sys
 import streamlit as st
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from pdf_extractor import extract_text_from_pdf, get_content_summary
-from llm_handler import AdaptiveLLM
-from report_generator import generate_assessment_report, get_weak_topics
+from typing import TYPE_CHECKING
+from styles import CUSTOM_CSS
+
+# pdf_extractor (PyMuPDF), llm_handler (cohere) and report_generator (reportlab)
+# are imported where first needed to keep app start-up fast
+if TYPE_CHECKING:
+    from llm_handler import AdaptiveLLM
+
+
+# Questions requested per LLM call when a difficulty's pool runs dry
+QUESTION_BATCH_SIZE = 5
+
+# Display name and CSS class per difficulty level, indexed by difficulty - 1
+DIFF_NAMES = ("Easy", "Medium", "Hard")
+DIFF_COLORS = ("difficulty-easy", "difficulty-medium", "difficulty-hard")
+
+# Previously asked questions the LLM is told to avoid
+ASKED_QUESTIONS_LIMIT = 10
+
+# Seconds to wait for a background batch before generating one directly
+PREFETCH_TIMEOUT = 30
+
+# Difficulty change indexed by the last three results packed as bits
+# (newest answer in bit 0): up with 2+ correct, down otherwise
+NEXT_DIFFICULTY_DELTA = (-1, -1, -1, 1, -1, 1, 1, 1)
 
 
 # Page Configuration
@@ -22,196 +48,7 @@ st.set_page_config(
 )
 
 # Custom CSS for beautiful UI
-st.markdown("""
-<style>
-    /* Main container styling */
-    .main {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        min-height: 100vh;
-    }
-    
-    .stApp {
-        background: linear-gradient(135deg, #1a1a2e 0%, #16213e 50%, #0f3460 100%);
-    }
-    
-    /* Header styling */
-    .main-header {
-        background: linear-gradient(90deg, #667eea 0%, #764ba2 100%);
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-        font-size: 3rem;
-        font-weight: 800;
-        text-align: center;
-        margin-bottom: 0.5rem;
-    }
-    
-    .sub-header {
-        color: #a0aec0;
-        text-align: center;
-        font-size: 1.1rem;
-        margin-bottom: 2rem;
-    }
-    
-    /* Card styling */
-    .card {
-        background: rgba(255, 255, 255, 0.05);
-        backdrop-filter: blur(10px);
-        border-radius: 20px;
-        padding: 2rem;
-        border: 1px solid rgba(255, 255, 255, 0.1);
-        margin-bottom: 1.5rem;
-        box-shadow: 0 8px 32px rgba(0, 0, 0, 0.3);
-    }
-    
-    /* Question card */
-    .question-card {
-        background: linear-gradient(145deg, rgba(102, 126, 234, 0.1) 0%, rgba(118, 75, 162, 0.1) 100%);
-        border-radius: 20px;
-        padding: 2rem;
-        border: 1px solid rgba(102, 126, 234, 0.3);
-        margin: 1rem 0;
-    }
-    
-    /* Difficulty badges */
-    .difficulty-easy {
-        background: linear-gradient(90deg, #48bb78 0%, #38a169 100%);
-        color: white;
-        padding: 0.3rem 1rem;
-        border-radius: 20px;
-        font-size: 0.9rem;
-        font-weight: 600;
-        display: inline-block;
-    }
-    
-    .difficulty-medium {
-        background: linear-gradient(90deg, #ed8936 0%, #dd6b20 100%);
-        color: white;
-        padding: 0.3rem 1rem;
-        border-radius: 20px;
-        font-size: 0.9rem;
-        font-weight: 600;
-        display: inline-block;
-    }
-    
-    .difficulty-hard {
-        background: linear-gradient(90deg, #f56565 0%, #e53e3e 100%);
-        color: white;
-        padding: 0.3rem 1rem;
-        border-radius: 20px;
-        font-size: 0.9rem;
-        font-weight: 600;
-        display: inline-block;
-    }
-    
-    /* Stats cards */
-    .stat-card {
-        background: rgba(255, 255, 255, 0.05);
-        border-radius: 15px;
-        padding: 1.5rem;
-        text-align: center;
-        border: 1px solid rgba(255, 255, 255, 0.1);
-    }
-    
-    .stat-value {
-        font-size: 2.5rem;
-        font-weight: 700;
-        background: linear-gradient(90deg, #667eea 0%, #764ba2 100%);
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-    }
-    
-    .stat-label {
-        color: #a0aec0;
-        font-size: 0.9rem;
-        margin-top: 0.5rem;
-    }
-    
-    /* Button styling */
-    .stButton > button {
-        background: linear-gradient(90deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        border: none;
-        border-radius: 10px;
-        padding: 0.75rem 2rem;
-        font-weight: 600;
-        transition: all 0.3s ease;
-        box-shadow: 0 4px 15px rgba(102, 126, 234, 0.4);
-    }
-    
-    .stButton > button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 6px 20px rgba(102, 126, 234, 0.6);
-    }
-    
-    /* Radio button styling */
-    .stRadio > div {
-        background: rgba(255, 255, 255, 0.03);
-        border-radius: 15px;
-        padding: 1rem;
-    }
-    
-    .stRadio > div > label {
-        color: #e2e8f0 !important;
-        font-size: 1rem;
-        padding: 0.75rem 1rem;
-        border-radius: 10px;
-        transition: all 0.2s ease;
-    }
-    
-    .stRadio > div > label:hover {
-        background: rgba(102, 126, 234, 0.2);
-    }
-    
-    /* Success/Error messages */
-    .success-message {
-        background: linear-gradient(90deg, rgba(72, 187, 120, 0.2) 0%, rgba(56, 161, 105, 0.2) 100%);
-        border: 1px solid #48bb78;
-        border-radius: 15px;
-        padding: 1.5rem;
-        margin: 1rem 0;
-    }
-    
-    .error-message {
-        background: linear-gradient(90deg, rgba(245, 101, 101, 0.2) 0%, rgba(229, 62, 62, 0.2) 100%);
-        border: 1px solid #f56565;
-        border-radius: 15px;
-        padding: 1.5rem;
-        margin: 1rem 0;
-    }
-    
-    /* Progress bar */
-    .stProgress > div > div {
-        background: linear-gradient(90deg, #667eea 0%, #764ba2 100%);
-    }
-    
-    /* Sidebar styling */
-    .css-1d391kg {
-        background: rgba(26, 26, 46, 0.95);
-    }
-    
-    /* File uploader */
-    .stFileUploader {
-        background: rgba(255, 255, 255, 0.05);
-        border-radius: 15px;
-        padding: 1rem;
-        border: 2px dashed rgba(102, 126, 234, 0.5);
-    }
-    
-    /* Hide Streamlit branding */
-    #MainMenu {visibility: hidden;}
-    footer {visibility: hidden;}
-    
-    /* Animations */
-    @keyframes fadeIn {
-        from { opacity: 0; transform: translateY(20px); }
-        to { opacity: 1; transform: translateY(0); }
-    }
-    
-    .fade-in {
-        animation: fadeIn 0.5s ease-out;
-    }
-</style>
-""", unsafe_allow_html=True)
+st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
 
 def init_session_state():
@@ -219,20 +56,27 @@ def init_session_state():
     defaults = {
         'pdf_content': None,
         'pdf_name': None,
+        'pdf_hash': None,  # SHA-256 of the uploaded PDF bytes
+        'pdf_file_id': None,  # Streamlit upload the hash was computed for
         'api_key': None,
         'llm': None,
         'current_question': None,
         'questions_history': [],
         'current_difficulty': 1,
-        'performance_window': [],  # Last N answers for adaptive difficulty
+        'answered': 0,  # Answers so far, capped at 3 (the adaptive window size)
+        'window_bits': 0,  # Last 3 answers packed into 3 bits (1 = correct)
+        'difficulty_sum': 0,  # Running total of answered question difficulties
         'assessment_started': False,
         'assessment_complete': False,
         'total_questions': 0,
         'correct_answers': 0,
-        'asked_questions': [],
-        'show_feedback': False,
+        'asked_questions': deque(maxlen=ASKED_QUESTIONS_LIMIT),
+        'phase': 'need_question',  # 'need_question' -> 'answering' -> 'feedback'
         'last_feedback': None,
         'max_difficulty_reached': 1,
+        'question_pool': {1: [], 2: [], 3: []},  # Pre-generated questions per difficulty
+        'next_question_futures': {},  # Background batch generation per difficulty
+        'prefetch_executor': None,  # This session's prefetch workers, created on first use
     }
     
     for key, value in defaults.items():
@@ -240,27 +84,251 @@ def init_session_state():
             st.session_state[key] = value
 
 
-def calculate_adaptive_difficulty(performance_window: list, current_difficulty: int) -> int:
+def reset_assessment():
+    """Reset all assessment progress, e.g. on a new PDF or a restart."""
+    cancel_prefetch()
+    st.session_state.assessment_started = False
+    st.session_state.assessment_complete = False
+    st.session_state.questions_history = []
+    st.session_state.total_questions = 0
+    st.session_state.correct_answers = 0
+    st.session_state.current_difficulty = 1
+    st.session_state.answered = 0
+    st.session_state.window_bits = 0
+    st.session_state.difficulty_sum = 0
+    st.session_state.current_question = None
+    st.session_state.asked_questions = deque(maxlen=ASKED_QUESTIONS_LIMIT)
+    st.session_state.question_pool = {1: [], 2: [], 3: []}
+    st.session_state.max_difficulty_reached = 1
+    st.session_state.phase = 'need_question'
+    st.session_state.last_feedback = None
+
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def extract_by_hash(pdf_hash: str, _file_bytes: bytes) -> str:
+    """
+    Extract PDF text once per content hash, shared by every session.
+    
+    cache_resource hands all sessions the same string object instead of a
+    copy, so users uploading the same PDF share one extraction in memory.
+    The bytes are left out of the cache key; the hash identifies them.
+    """
+    from pdf_extractor import extract_text_from_pdf
+    
+    return extract_text_from_pdf(_file_bytes)
+
+
+@st.cache_data
+def cached_summary(pdf_hash: str, _content: str, max_chars: int) -> str:
+    """Build the content preview once per (PDF, length) without hashing the text."""
+    from pdf_extractor import get_content_summary
+    
+    return get_content_summary(_content, max_chars)
+
+
+@st.cache_resource
+def get_llm(api_key: str) -> "AdaptiveLLM":
+    """Create the LLM handler once per API key and reuse it across reruns and sessions."""
+    from llm_handler import AdaptiveLLM
+    
+    return AdaptiveLLM(api_key)
+
+
+def get_prefetch_executor() -> ThreadPoolExecutor:
+    """
+    Worker pool used to generate this session's upcoming questions in the background.
+    
+    Futures are keyed by difficulty, so one worker per difficulty lets every
+    prefetch start at once instead of queueing behind other sessions' calls.
+    The idle workers exit when the session state (and the pool) is collected.
+    """
+    if st.session_state.prefetch_executor is None:
+        st.session_state.prefetch_executor = ThreadPoolExecutor(
+            max_workers=len(DIFF_NAMES), thread_name_prefix="prefetch"
+        )
+    return st.session_state.prefetch_executor
+
+
+def prefetch_next_question(question: dict):
+    """
+    Start generating every possible next batch while the user answers the current one.
+    
+    The adaptive rule allows at most two next difficulties (one per outcome),
+    so both are prefetched and the answer picks the one that is used.
+    Difficulties whose pool still has questions are skipped.
+    """
+    if question.get('error'):
+        return
+    
+    answered = min(st.session_state.answered + 1, 3)
+    current = st.session_state.current_difficulty
+    possible_next = {
+        calculate_adaptive_difficulty(answered, window_bits_after(True), current),
+        calculate_adaptive_difficulty(answered, window_bits_after(False), current)
+    }
+    
+    futures = st.session_state.next_question_futures
+    asked_questions = None
+    for difficulty in possible_next:
+        if difficulty in futures or st.session_state.question_pool[difficulty]:
+            continue
+        
+        if asked_questions is None:
+            # Snapshot the deque so the worker never iterates it while it is appended to
+            asked_questions = list(st.session_state.asked_questions)
+        
+        futures[difficulty] = get_prefetch_executor().submit(
+            st.session_state.llm.generate_question_batch,
+            st.session_state.pdf_content,
+            difficulty,
+            QUESTION_BATCH_SIZE,
+            asked_questions
+        )
+
+
+def harvest_prefetched():
+    """Move finished background batches into their pools."""
+    futures = st.session_state.next_question_futures
+    for difficulty, future in list(futures.items()):
+        if not future.done():
+            continue
+        del futures[difficulty]
+        if future.cancelled() or future.exception() is not None:
+            continue
+        questions = future.result()
+        if not questions[0].get('error'):
+            st.session_state.question_pool[difficulty].extend(questions)
+
+
+def take_prefetched_questions(difficulty: int) -> list:
+    """
+    Wait for the background batch of the requested difficulty, if one is running.
+    
+    Returns:
+        List of question dicts, empty if they must be generated directly.
+    """
+    future = st.session_state.next_question_futures.pop(difficulty, None)
+    if future is None:
+        return []
+    
+    # A batch that has not started yet is no faster than generating directly
+    if future.cancel():
+        return []
+    
+    try:
+        questions = future.result(timeout=PREFETCH_TIMEOUT)
+    except Exception:
+        # Generated directly instead; drop the late batch if it can still be stopped
+        future.cancel()
+        return []
+    
+    return [] if questions[0].get('error') else questions
+
+
+def cancel_other_prefetches(difficulty: int):
+    """
+    Cancel queued batches for the difficulty the answer did not lead to.
+    
+    Batches already running cannot be cancelled; they stay registered and
+    are harvested into their pool when done.
+    """
+    futures = st.session_state.next_question_futures
+    for other, future in list(futures.items()):
+        if other != difficulty and future.cancel():
+            del futures[other]
+
+
+def next_question(difficulty: int) -> dict:
+    """
+    Pop the next question for a difficulty, refilling its pool with one batched call when empty.
+    """
+    harvest_prefetched()
+    
+    pool = st.session_state.question_pool[difficulty]
+    if not pool:
+        questions = take_prefetched_questions(difficulty)
+        if not questions:
+            questions = st.session_state.llm.generate_question_batch(
+                content=st.session_state.pdf_content,
+                difficulty=difficulty,
+                n=QUESTION_BATCH_SIZE,
+                asked_questions=st.session_state.asked_questions
+            )
+        # Error placeholders are shown once, never pooled
+        if questions[0].get('error'):
+            return questions[0]
+        pool.extend(questions)
+    
+    return pool.pop(0)
+
+
+def evaluate_answer_and_refill(question: dict, answer: str, next_difficulty: int) -> dict:
+    """
+    Evaluate the submitted answer, overlapping it with generation of the next batch.
+    
+    The batch is only generated here when the next difficulty's pool is empty
+    and no background prefetch is already producing it.
+    """
+    llm = st.session_state.llm
+    pool = st.session_state.question_pool[next_difficulty]
+    cancel_other_prefetches(next_difficulty)
+    harvest_prefetched()
+    evaluation = dict(
+        question=question.get('question', ''),
+        user_answer=answer,
+        correct_answer=question.get('correct_answer', ''),
+        options=question.get('options', {}),
+        content=st.session_state.pdf_content
+    )
+    
+    if pool or next_difficulty in st.session_state.next_question_futures:
+        return llm.evaluate_answer(**evaluation)
+    
+    feedback, questions = llm.run_concurrently(
+        llm.aevaluate_answer(**evaluation),
+        llm.agenerate_question_batch(
+            content=st.session_state.pdf_content,
+            difficulty=next_difficulty,
+            n=QUESTION_BATCH_SIZE,
+            asked_questions=list(st.session_state.asked_questions)
+        )
+    )
+    if not questions[0].get('error'):
+        pool.extend(questions)
+    
+    return feedback
+
+
+def cancel_prefetch():
+    """Discard all batches being generated in the background."""
+    for future in st.session_state.next_question_futures.values():
+        future.cancel()
+    st.session_state.next_question_futures = {}
+
+
+def calculate_adaptive_difficulty(answered: int, window_bits: int, current_difficulty: int) -> int:
     """
     Calculate new difficulty based on recent performance.
     
+    Args:
+        answered: Answers given so far, capped at 3
+        window_bits: Last three results packed as bits (1 = correct)
+        current_difficulty: Current difficulty level
+    
     Rules:
     - If 2+ correct in last 3: increase difficulty
     - If 2+ incorrect in last 3: decrease difficulty
     - Otherwise: maintain current difficulty
     """
-    if len(performance_window) < 3:
+    if answered < 3:
         return current_difficulty
     
-    recent = performance_window[-3:]
-    correct_count = sum(recent)
-    
-    if correct_count >= 2 and current_difficulty < 3:
-        return current_difficulty + 1
-    elif correct_count <= 1 and current_difficulty > 1:
-        return current_difficulty - 1
-    
-    return current_difficulty
+    return min(3, max(1, current_difficulty + NEXT_DIFFICULTY_DELTA[window_bits]))
+
+
+def window_bits_after(is_correct: bool) -> int:
+    """Packed performance window once is_correct is added to it."""
+    return ((st.session_state.window_bits << 1) | is_correct) & 0b111
 
 
 def get_performance_metrics() -> dict:
@@ -273,8 +341,7 @@ def get_performance_metrics() -> dict:
         avg_difficulty = 1
     else:
         accuracy = (correct / total) * 100
-        difficulties = [q.get('difficulty', 1) for q in st.session_state.questions_history]
-        avg_difficulty = sum(difficulties) / len(difficulties) if difficulties else 1
+        avg_difficulty = st.session_state.difficulty_sum / total
     
     return {
         'total_questions': total,
@@ -302,7 +369,7 @@ def render_sidebar():
         
         if api_key and api_key != st.session_state.api_key:
             st.session_state.api_key = api_key
-            st.session_state.llm = AdaptiveLLM(api_key)
+            st.session_state.llm = get_llm(api_key)
             st.success("✅ API Key set!")
         
         st.markdown("---")
@@ -316,32 +383,34 @@ def render_sidebar():
         )
         
         if uploaded_file:
-            if uploaded_file.name != st.session_state.pdf_name:
-                try:
-                    with st.spinner("📖 Extracting content..."):
-                        content = extract_text_from_pdf(uploaded_file)
-                        st.session_state.pdf_content = content
-                        st.session_state.pdf_name = uploaded_file.name
-                        # Reset assessment on new PDF
-                        st.session_state.assessment_started = False
-                        st.session_state.assessment_complete = False
-                        st.session_state.questions_history = []
-                        st.session_state.total_questions = 0
-                        st.session_state.correct_answers = 0
-                        st.session_state.current_difficulty = 1
-                        st.session_state.performance_window = []
-                        st.session_state.asked_questions = []
-                        st.session_state.max_difficulty_reached = 1
-                    
-                    st.success(f"✅ Loaded: {uploaded_file.name}")
-                    
-                except Exception as e:
-                    st.error(f"❌ Error: {str(e)}")
+            if uploaded_file.file_id != st.session_state.pdf_file_id:
+                file_bytes = uploaded_file.getvalue()
+                pdf_hash = hashlib.sha256(file_bytes).hexdigest()
+                
+                if pdf_hash == st.session_state.pdf_hash:
+                    st.session_state.pdf_file_id = uploaded_file.file_id
+                else:
+                    try:
+                        with st.spinner("📖 Extracting content..."):
+                            content = extract_by_hash(pdf_hash, file_bytes)
+                            st.session_state.pdf_content = content
+                            st.session_state.pdf_name = uploaded_file.name
+                            st.session_state.pdf_hash = pdf_hash
+                            # Mark the upload handled only once extraction succeeded,
+                            # so a failed upload is retried on the next rerun
+                            st.session_state.pdf_file_id = uploaded_file.file_id
+                            # Reset assessment on new PDF
+                            reset_assessment()
+                        
+                        st.success(f"✅ Loaded: {uploaded_file.name}")
+                        
+                    except Exception as e:
+                        st.error(f"❌ Error: {str(e)}")
         
         if st.session_state.pdf_content:
             st.markdown("---")
             with st.expander("📝 Content Preview"):
-                preview = get_content_summary(st.session_state.pdf_content, 500)
+                preview = cached_summary(st.session_state.pdf_hash, st.session_state.pdf_content, 500)
                 st.text(preview)
         
         st.markdown("---")
@@ -357,8 +426,7 @@ def render_sidebar():
                 st.metric("Correct", metrics['correct_answers'])
             with col2:
                 st.metric("Accuracy", f"{metrics['accuracy']:.0f}%")
-                diff_names = {1: "Easy", 2: "Medium", 3: "Hard"}
-                st.metric("Level", diff_names[metrics['current_difficulty']])
+                st.metric("Level", DIFF_NAMES[metrics['current_difficulty'] - 1])
 
 
 def render_welcome():
@@ -421,22 +489,23 @@ def render_welcome():
                 st.rerun()
 
 
+def render_question_html(question: dict) -> str:
+    """Format the question card once, when the question becomes current."""
+    difficulty = question.get('difficulty', 1)
+    return f"""
+    <div class="question-card fade-in">
+        <span class="{DIFF_COLORS[difficulty - 1]}" style="margin-bottom: 1rem; display: inline-block;">
+            {DIFF_NAMES[difficulty - 1]} • {question.get('topic', 'General')}
+        </span>
+        <h3 style="color: #e2e8f0; margin-top: 1rem; line-height: 1.6;">
+            {question.get('question', 'Question not available')}
+        </h3>
+    </div>
+    """
+
+
 def render_question():
     """Render the current question."""
-    # Generate new question if needed
-    if st.session_state.current_question is None or st.session_state.show_feedback == False:
-        if not st.session_state.show_feedback:
-            with st.spinner("🤔 Generating question..."):
-                question_data = st.session_state.llm.generate_question(
-                    content=st.session_state.pdf_content,
-                    difficulty=st.session_state.current_difficulty,
-                    asked_questions=st.session_state.asked_questions
-                )
-                st.session_state.current_question = question_data
-                st.session_state.asked_questions.append(question_data.get('question', ''))
-    
-    question = st.session_state.current_question
-    
     # Header with stats
     col1, col2, col3, col4 = st.columns(4)
     
@@ -459,11 +528,9 @@ def render_question():
         """, unsafe_allow_html=True)
     
     with col3:
-        diff_names = {1: "Easy", 2: "Medium", 3: "Hard"}
-        diff_colors = {1: "difficulty-easy", 2: "difficulty-medium", 3: "difficulty-hard"}
         st.markdown(f"""
         <div class="stat-card">
-            <span class="{diff_colors[st.session_state.current_difficulty]}">{diff_names[st.session_state.current_difficulty]}</span>
+            <span class="{DIFF_COLORS[st.session_state.current_difficulty - 1]}">{DIFF_NAMES[st.session_state.current_difficulty - 1]}</span>
             <div class="stat-label" style="margin-top: 0.75rem;">Current Level</div>
         </div>
         """, unsafe_allow_html=True)
@@ -471,35 +538,53 @@ def render_question():
     with col4:
         st.markdown(f"""
         <div class="stat-card">
-            <div class="stat-value">{diff_names[metrics['max_difficulty_reached']]}</div>
+            <div class="stat-value">{DIFF_NAMES[metrics['max_difficulty_reached'] - 1]}</div>
             <div class="stat-label">Max Level</div>
         </div>
         """, unsafe_allow_html=True)
     
     st.markdown("---")
     
+    question_panel()
+
+
+@st.fragment
+def question_panel():
+    """
+    Render the question, answer options and feedback.
+    
+    Runs as a fragment, so selecting an option or moving to the next question
+    reruns only this panel. Submitting and finishing rerun the whole app because
+    they change the stats shown outside it.
+    """
+    # Generate a question only when the phase asks for one, never on unrelated reruns
+    if st.session_state.phase == 'need_question':
+        with st.spinner("🤔 Generating question..."):
+            question_data = next_question(st.session_state.current_difficulty)
+            question_data['html'] = render_question_html(question_data)
+            st.session_state.current_question = question_data
+            st.session_state.asked_questions.append(sys.intern(question_data.get('question', '')))
+        st.session_state.phase = 'answering'
+    
+    question = st.session_state.current_question
+    
     # Question display
     if question.get('error'):
         st.error(f"Error: {question.get('error_message', 'Unknown error')}")
         st.warning(f"Question text: {question.get('question', 'No details')}")
         if st.button("🔄 Try Again"):
             st.session_state.current_question = None
-            st.rerun()
+            st.session_state.phase = 'need_question'
+            st.rerun(scope="fragment")
         return
     
-    st.markdown(f"""
-    <div class="question-card fade-in">
-        <span class="{diff_colors[question.get('difficulty', 1)]}" style="margin-bottom: 1rem; display: inline-block;">
-            {diff_names[question.get('difficulty', 1)]} • {question.get('topic', 'General')}
-        </span>
-        <h3 style="color: #e2e8f0; margin-top: 1rem; line-height: 1.6;">
-            {question.get('question', 'Question not available')}
-        </h3>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(question['html'], unsafe_allow_html=True)
     
     # Answer options
-    if not st.session_state.show_feedback:
+    if st.session_state.phase == 'answering':
+        # Generate the next question while the user thinks about this one
+        prefetch_next_question(question)
+        
         options = question.get('options', {})
         
         answer = st.radio(
@@ -512,30 +597,27 @@ def render_question():
         col1, col2, col3 = st.columns([1, 2, 1])
         with col2:
             if st.button("✅ Submit Answer", use_container_width=True):
-                # Evaluate answer
-                feedback = st.session_state.llm.evaluate_answer(
-                    question=question.get('question', ''),
-                    user_answer=answer,
-                    correct_answer=question.get('correct_answer', ''),
-                    options=options,
-                    content=st.session_state.pdf_content
-                )
+                is_correct = answer.upper() == question.get('correct_answer', '').upper()
                 
-                is_correct = feedback['is_correct']
+                # Calculate new difficulty up front so its questions can be
+                # generated while the answer is being evaluated
+                window_bits = window_bits_after(is_correct)
+                new_difficulty = calculate_adaptive_difficulty(
+                    min(st.session_state.answered + 1, 3),
+                    window_bits,
+                    st.session_state.current_difficulty
+                )
+                feedback = evaluate_answer_and_refill(question, answer, new_difficulty)
                 
                 # Update stats
                 st.session_state.total_questions += 1
                 if is_correct:
                     st.session_state.correct_answers += 1
+                st.session_state.difficulty_sum += question.get('difficulty', 1)
                 
                 # Update performance window
-                st.session_state.performance_window.append(1 if is_correct else 0)
-                
-                # Calculate new difficulty
-                new_difficulty = calculate_adaptive_difficulty(
-                    st.session_state.performance_window,
-                    st.session_state.current_difficulty
-                )
+                st.session_state.answered = min(st.session_state.answered + 1, 3)
+                st.session_state.window_bits = window_bits
                 
                 # Track max difficulty
                 if new_difficulty > st.session_state.max_difficulty_reached:
@@ -562,7 +644,7 @@ def render_question():
                 
                 st.session_state.current_difficulty = new_difficulty
                 st.session_state.last_feedback = feedback
-                st.session_state.show_feedback = True
+                st.session_state.phase = 'feedback'
                 st.rerun()
     
     else:
@@ -600,9 +682,9 @@ def render_question():
         with col2:
             if st.button("➡️ Next Question", use_container_width=True):
                 st.session_state.current_question = None
-                st.session_state.show_feedback = False
+                st.session_state.phase = 'need_question'
                 st.session_state.last_feedback = None
-                st.rerun()
+                st.rerun(scope="fragment")
         
         with col3:
             if st.button("🏁 Finish Assessment", use_container_width=True):
@@ -612,6 +694,8 @@ def render_question():
 
 def render_results():
     """Render the final results and report generation."""
+    from report_generator import generate_assessment_report, get_weak_topics
+    
     st.markdown('<h1 class="main-header">🎉 Assessment Complete!</h1>', unsafe_allow_html=True)
     
     metrics = get_performance_metrics()
@@ -644,10 +728,9 @@ def render_results():
         """, unsafe_allow_html=True)
     
     with col4:
-        diff_names = {1: "Easy", 2: "Medium", 3: "Hard"}
         st.markdown(f"""
         <div class="stat-card">
-            <div class="stat-value">{diff_names[metrics['max_difficulty_reached']]}</div>
+            <div class="stat-value">{DIFF_NAMES[metrics['max_difficulty_reached'] - 1]}</div>
             <div class="stat-label">Max Difficulty</div>
         </div>
         """, unsafe_allow_html=True)
@@ -726,18 +809,7 @@ def render_results():
     with col2:
         if st.button("🔄 Start New Assessment", use_container_width=True):
             # Reset state
-            st.session_state.assessment_started = False
-            st.session_state.assessment_complete = False
-            st.session_state.questions_history = []
-            st.session_state.total_questions = 0
-            st.session_state.correct_answers = 0
-            st.session_state.current_difficulty = 1
-            st.session_state.performance_window = []
-            st.session_state.current_question = None
-            st.session_state.asked_questions = []
-            st.session_state.max_difficulty_reached = 1
-            st.session_state.show_feedback = False
-            st.session_state.last_feedback = None
+            reset_assessment()
             st.rerun()
 
 
@@ -3,10 +3,123 @@ LLM Handler Module
 Handles all Cohere Command R+ API interactions for question generation and evaluation.
 """
 
+import asyncio
 import cohere
-import json
-import re
-from typing import Dict, List, Optional
+import hashlib
+import msgspec
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+
+class Question(msgspec.Struct):
+    """
+    Schema of a generated question, validated while the JSON is decoded.
+    """
+    question: str
+    options: Dict[str, str]
+    correct_answer: str
+    explanation: str = ""
+    topic: str = "General"
+
+
+class QuestionBatch(msgspec.Struct):
+    """
+    Schema of a batch response.
+    """
+    questions: List[Question]
+
+
+_QUESTION_DECODER = msgspec.json.Decoder(Question)
+_BATCH_DECODER = msgspec.json.Decoder(QuestionBatch)
+
+
+# Static parts of the question prompt, joined with the per-call values
+_DIFFICULTY_GUIDE = """
+- EASY: Basic recall and understanding questions. Test fundamental concepts.
+- MEDIUM: Application and analysis questions. Require connecting ideas.
+- HARD: Synthesis and evaluation questions. Require deep understanding and critical thinking.
+"""
+
+_SINGLE_NOVELTY = "\n\nIMPORTANT: Generate a completely NEW question that tests understanding of the content."
+
+_BATCH_NOVELTY = "\n\nIMPORTANT: Generate completely NEW questions that each test a different part of the content."
+
+_QUESTION_FORMAT = """
+
+Respond ONLY with a valid JSON object in this exact format (no markdown, no extra text):
+{
+    "question": "The question text here?",
+    "options": {
+        "A": "First option",
+        "B": "Second option",
+        "C": "Third option",
+        "D": "Fourth option"
+    },
+    "correct_answer": "A",
+    "explanation": "Explanation of why this is the correct answer.",
+    "topic": "The main topic this question tests"
+}"""
+
+_BATCH_FORMAT = """
+
+Respond ONLY with a valid JSON object in this exact format (no markdown, no extra text):
+{
+    "questions": [
+        {
+            "question": "The question text here?",
+            "options": {
+                "A": "First option",
+                "B": "Second option",
+                "C": "Third option",
+                "D": "Fourth option"
+            },
+            "correct_answer": "A",
+            "explanation": "Explanation of why this is the correct answer.",
+            "topic": "The main topic this question tests"
+        }
+    ]
+}"""
+
+
+class _JsonObjectTracker:
+    """
+    Tracks brace depth across streamed text to spot the end of the first JSON object.
+    
+    Braces inside JSON strings (including escaped quotes) are ignored.
+    """
+    
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+    
+    def feed(self, text: str) -> int:
+        """
+        Consume the next piece of text.
+        
+        Returns:
+            int: Index just past the closing brace of the first top-level
+            object if it ends in this piece, otherwise -1
+        """
+        for i, char in enumerate(text):
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                # Quotes only start strings inside the object, not in prose before it
+                self.in_string = self.depth > 0
+            elif char == '{':
+                self.depth += 1
+            elif char == '}' and self.depth > 0:
+                self.depth -= 1
+                if self.depth == 0:
+                    return i + 1
+        return -1
 
 
 class AdaptiveLLM:
@@ -20,6 +133,13 @@ class AdaptiveLLM:
         3: "hard"
     }
     
+    # Content longer than this is condensed into a digest before question generation
+    QUESTION_CONTENT_CHARS = 6000
+    # How much of the source text the digest is allowed to cover
+    DIGEST_SOURCE_CHARS = 24000
+    # Digests kept, least recently used first out (matches extract_by_hash's cache)
+    DIGEST_CACHE_SIZE = 32
+    
     def __init__(self, api_key: str):
         """
         Initialize the Cohere client.
@@ -31,36 +151,202 @@ class AdaptiveLLM:
         try:
             # Try the newer ClientV2 first
             self.client = cohere.ClientV2(api_key=api_key)
+            self.aclient = cohere.AsyncClientV2(api_key=api_key)
             self.use_v2 = True
         except AttributeError:
             # Fall back to older Client
             self.client = cohere.Client(api_key=api_key)
+            self.aclient = cohere.AsyncClient(api_key=api_key)
             self.use_v2 = False
         # Use the latest available Command R+ model
         self.model = "command-r-plus-08-2024"
+        
+        # Content digests keyed by SHA-256 of the source text. The shared lock only
+        # guards these dicts; the per-key locks serialize digesting one content
+        self._content_digests: "OrderedDict[str, str]" = OrderedDict()
+        self._digest_key_locks: Dict[str, threading.Lock] = {}
+        self._digest_lock = threading.Lock()
+        
+        # The async client's connections belong to one event loop, so all
+        # coroutines run on this long-lived loop instead of asyncio.run()
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, daemon=True).start()
     
-    def _call_chat(self, prompt: str) -> str:
+    def _call_chat(self, prompt: str, system: Optional[str] = None, json_response: bool = False) -> str:
         """
         Call the Cohere chat API with the appropriate method.
+        
+        Args:
+            prompt: The user message
+            system: Optional system message, kept identical across calls so
+                the provider can reuse the cached prefix
+            json_response: Stream the reply and return as soon as the first
+                JSON object is complete, skipping whatever the model adds after it
+        """
+        kwargs = self._chat_kwargs(prompt, system)
+        
+        if json_response:
+            tracker = _JsonObjectTracker()
+            parts = []
+            for event in self.client.chat_stream(**kwargs):
+                text = self._stream_text(event)
+                if text:
+                    end = tracker.feed(text)
+                    if end >= 0:
+                        parts.append(text[:end])
+                        break
+                    parts.append(text)
+            return "".join(parts)
+        
+        response = self.client.chat(**kwargs)
+        return response.message.content[0].text if self.use_v2 else response.text
+    
+    async def _acall_chat(self, prompt: str, system: Optional[str] = None, json_response: bool = False) -> str:
+        """
+        Async counterpart of _call_chat using the async Cohere client.
+        """
+        kwargs = self._chat_kwargs(prompt, system)
+        
+        if json_response:
+            tracker = _JsonObjectTracker()
+            parts = []
+            stream = self.aclient.chat_stream(**kwargs)
+            try:
+                async for event in stream:
+                    text = self._stream_text(event)
+                    if text:
+                        end = tracker.feed(text)
+                        if end >= 0:
+                            parts.append(text[:end])
+                            break
+                        parts.append(text)
+            finally:
+                # Release the HTTP response now rather than when the generator is collected,
+                # including when iteration fails or the task is cancelled
+                await stream.aclose()
+            return "".join(parts)
+        
+        response = await self.aclient.chat(**kwargs)
+        return response.message.content[0].text if self.use_v2 else response.text
+    
+    def _chat_kwargs(self, prompt: str, system: Optional[str]) -> Dict:
+        """
+        Build chat request arguments for the client version in use.
         """
         if self.use_v2:
-            response = self.client.chat(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            return response.message.content[0].text
-        else:
-            response = self.client.chat(
-                model=self.model,
-                message=prompt
-            )
-            return response.text
+            messages = [{"role": "user", "content": prompt}]
+            if system:
+                messages.insert(0, {"role": "system", "content": system})
+            return {"model": self.model, "messages": messages}
+        
+        return {"model": self.model, "message": prompt, "preamble": system}
+    
+    def _stream_text(self, event) -> Optional[str]:
+        """
+        Get the generated text carried by a chat stream event, if any.
+        """
+        if self.use_v2:
+            if event.type == "content-delta":
+                return event.delta.message.content.text
+        elif event.event_type == "text-generation":
+            return event.text
+        return None
+    
+    def run_concurrently(self, *coroutines) -> List:
+        """
+        Run coroutines (e.g. aevaluate_answer and agenerate_question_batch) concurrently.
+        
+        Args:
+            coroutines: Coroutines created from this instance's async methods
+            
+        Returns:
+            List of their results, in order
+        """
+        async def gather():
+            return await asyncio.gather(*coroutines)
+        
+        return asyncio.run_coroutine_threadsafe(gather(), self._loop).result()
+    
+    def get_content_digest(self, content: str) -> str:
+        """
+        Get the condensed source text used for question generation.
+        
+        Long content is summarized once into a study outline with a single LLM
+        call, so each question prompt carries the outline instead of raw text.
+        Digests are cached per content hash.
+        
+        Args:
+            content: The full PDF content
+            
+        Returns:
+            str: The outline, or the content itself if it is already short
+        """
+        if len(content) <= self.QUESTION_CONTENT_CHARS:
+            return content
+        
+        content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        with self._digest_lock:
+            digest = self._cached_digest(content_hash)
+            if digest is not None:
+                return digest
+            key_lock = self._digest_key_locks.setdefault(content_hash, threading.Lock())
+        
+        # Only callers digesting the same content wait on each other
+        with key_lock:
+            with self._digest_lock:
+                digest = self._cached_digest(content_hash)
+            if digest is not None:
+                return digest
+            
+            prompt = f"""Condense the following learning material into a detailed study outline of at most 1500 tokens.
+Keep every key concept, definition, fact, formula and relationship that a quiz could test. Use plain text with short bullet points.
+
+MATERIAL:
+{content[:self.DIGEST_SOURCE_CHARS]}"""
+            
+            try:
+                digest = self._call_chat(prompt).strip()
+            except Exception:
+                digest = ""
+            
+            with self._digest_lock:
+                # Drop the per-key lock whether or not the digest succeeded
+                if self._digest_key_locks.get(content_hash) is key_lock:
+                    del self._digest_key_locks[content_hash]
+                if digest:
+                    self._content_digests[content_hash] = digest
+                    while len(self._content_digests) > self.DIGEST_CACHE_SIZE:
+                        self._content_digests.popitem(last=False)
+            
+            # A failed digest is not cached, so the next question retries it
+            return digest or content[:self.QUESTION_CONTENT_CHARS]
+    
+    def _cached_digest(self, content_hash: str) -> Optional[str]:
+        """
+        Look up a digest and mark it most recently used. Caller holds _digest_lock.
+        """
+        digest = self._content_digests.get(content_hash)
+        if digest is not None:
+            self._content_digests.move_to_end(content_hash)
+        return digest
+    
+    def _question_system_message(self, content: str) -> str:
+        """
+        Build the system message holding the learning content.
+        
+        It does not depend on difficulty or history, so it is byte-identical
+        for every question generated from the same content.
+        """
+        return f"""You are an expert educational assessment creator. You write multiple-choice questions based only on the following learning content.
+
+CONTENT:
+{self.get_content_digest(content)}"""
     
     def generate_question(
         self, 
         content: str, 
         difficulty: int,
-        asked_questions: List[str] = None,
+        asked_questions: Optional[Iterable[str]] = None,
         topic_focus: Optional[str] = None
     ) -> Dict:
         """
@@ -69,7 +355,7 @@ class AdaptiveLLM:
         Args:
             content: The PDF content to generate questions from
             difficulty: Difficulty level (1=easy, 2=medium, 3=hard)
-            asked_questions: List of previously asked questions to avoid repetition
+            asked_questions: Recently asked questions to avoid repeating
             topic_focus: Optional specific topic to focus on
             
         Returns:
@@ -77,67 +363,160 @@ class AdaptiveLLM:
         """
         difficulty_name = self.DIFFICULTY_LEVELS.get(difficulty, "medium")
         
-        asked_list = ""
-        if asked_questions:
-            asked_list = "\n".join([f"- {q}" for q in asked_questions[-10:]])
-            asked_list = f"\n\nAVOID THESE PREVIOUSLY ASKED QUESTIONS:\n{asked_list}"
-        
-        topic_instruction = ""
-        if topic_focus:
-            topic_instruction = f"\n\nFOCUS ON THIS TOPIC: {topic_focus}"
-        
-        prompt = f"""You are an expert educational assessment creator. Based on the following learning content, generate ONE {difficulty_name.upper()} difficulty multiple-choice question.
-
-CONTENT:
-{content[:6000]}
-
-DIFFICULTY LEVEL: {difficulty_name.upper()}
-- EASY: Basic recall and understanding questions. Test fundamental concepts.
-- MEDIUM: Application and analysis questions. Require connecting ideas.
-- HARD: Synthesis and evaluation questions. Require deep understanding and critical thinking.
-{asked_list}{topic_instruction}
-
-IMPORTANT: Generate a completely NEW question that tests understanding of the content.
-
-Respond ONLY with a valid JSON object in this exact format (no markdown, no extra text):
-{{
-    "question": "The question text here?",
-    "options": {{
-        "A": "First option",
-        "B": "Second option",
-        "C": "Third option",
-        "D": "Fourth option"
-    }},
-    "correct_answer": "A",
-    "explanation": "Explanation of why this is the correct answer.",
-    "topic": "The main topic this question tests"
-}}"""
+        prompt = self._build_question_prompt(
+            difficulty_name, asked_questions, topic_focus, _QUESTION_FORMAT
+        )
 
         try:
-            response_text = self._call_chat(prompt)
+            response_text = self._call_chat(
+                prompt, system=self._question_system_message(content), json_response=True
+            )
             
-            # Extract JSON from response
-            question_data = self._parse_json_response(response_text)
+            # Extract and validate JSON from response
+            question = self._parse_json_response(response_text, _QUESTION_DECODER)
+            question_data = msgspec.structs.asdict(question)
             question_data["difficulty"] = difficulty
             question_data["difficulty_name"] = difficulty_name
             
             return question_data
             
         except Exception as e:
-            error_msg = str(e)
-            return {
-                "question": f"Error: {error_msg}",
-                "options": {"A": "Option A", "B": "Option B", "C": "Option C", "D": "Option D"},
-                "correct_answer": "A",
-                "explanation": f"Error details: {error_msg}",
-                "topic": "Unknown",
-                "difficulty": difficulty,
-                "difficulty_name": difficulty_name,
-                "error": True,
-                "error_message": error_msg
-            }
-
+            return self._error_question(str(e), difficulty, difficulty_name)
+    
+    def generate_question_batch(
+        self,
+        content: str,
+        difficulty: int,
+        n: int = 5,
+        asked_questions: Optional[Iterable[str]] = None,
+        topic_focus: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Generate several questions of one difficulty level in a single API call.
+        
+        Args:
+            content: The PDF content to generate questions from
+            difficulty: Difficulty level (1=easy, 2=medium, 3=hard)
+            n: Number of questions to generate
+            asked_questions: Recently asked questions to avoid repeating
+            topic_focus: Optional specific topic to focus on
+            
+        Returns:
+            List of question dicts in the same format as generate_question.
+            On failure, a single-item list holding the error question.
+        """
+        difficulty_name = self.DIFFICULTY_LEVELS.get(difficulty, "medium")
+        prompt = self._build_question_prompt(
+            difficulty_name, asked_questions, topic_focus, _BATCH_FORMAT, count=n
+        )
+        
+        try:
+            response_text = self._call_chat(
+                prompt, system=self._question_system_message(content), json_response=True
+            )
+            return self._parse_question_batch(response_text, difficulty, difficulty_name)
+            
+        except Exception as e:
+            return [self._error_question(str(e), difficulty, difficulty_name)]
     
+    async def agenerate_question_batch(
+        self,
+        content: str,
+        difficulty: int,
+        n: int = 5,
+        asked_questions: Optional[Iterable[str]] = None,
+        topic_focus: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Async counterpart of generate_question_batch, for use with run_concurrently.
+        """
+        difficulty_name = self.DIFFICULTY_LEVELS.get(difficulty, "medium")
+        prompt = self._build_question_prompt(
+            difficulty_name, asked_questions, topic_focus, _BATCH_FORMAT, count=n
+        )
+        
+        try:
+            # The digest may need its own (blocking) LLM call the first time
+            system = await asyncio.to_thread(self._question_system_message, content)
+            response_text = await self._acall_chat(prompt, system=system, json_response=True)
+            return self._parse_question_batch(response_text, difficulty, difficulty_name)
+            
+        except Exception as e:
+            return [self._error_question(str(e), difficulty, difficulty_name)]
+    
+    def _parse_question_batch(self, response_text: str, difficulty: int, difficulty_name: str) -> List[Dict]:
+        """
+        Parse a batch response and tag each question with its difficulty.
+        """
+        batch = self._parse_json_response(response_text, _BATCH_DECODER)
+        if not batch.questions:
+            raise ValueError("No questions found in response")
+        
+        questions = []
+        for question in batch.questions:
+            question_data = msgspec.structs.asdict(question)
+            question_data["difficulty"] = difficulty
+            question_data["difficulty_name"] = difficulty_name
+            questions.append(question_data)
+        
+        return questions
+    
+    def _build_question_prompt(
+        self,
+        difficulty_name: str,
+        asked_questions: Optional[Iterable[str]],
+        topic_focus: Optional[str],
+        response_format: str,
+        count: int = 1
+    ) -> str:
+        """
+        Build the question-generation instructions shared by single and batch requests.
+        
+        The prompt is assembled from the module-level static parts with a single
+        join. asked_questions is used as-is; callers keep it bounded (the app
+        passes a deque with a maxlen).
+        """
+        level = difficulty_name.upper()
+        
+        if count == 1:
+            parts = ["Based on the learning content, generate ONE ", level,
+                     " difficulty multiple-choice question.\n\nDIFFICULTY LEVEL: ", level,
+                     _DIFFICULTY_GUIDE]
+        else:
+            parts = ["Based on the learning content, generate ", str(count), " different ", level,
+                     " difficulty multiple-choice questions.\n\nDIFFICULTY LEVEL: ", level,
+                     _DIFFICULTY_GUIDE]
+        
+        if asked_questions:
+            parts.append("\n\nAVOID THESE PREVIOUSLY ASKED QUESTIONS:")
+            for q in asked_questions:
+                parts.append("\n- ")
+                parts.append(q)
+        
+        if topic_focus:
+            parts.append("\n\nFOCUS ON THIS TOPIC: ")
+            parts.append(topic_focus)
+        
+        parts.append(_SINGLE_NOVELTY if count == 1 else _BATCH_NOVELTY)
+        parts.append(response_format)
+        
+        return "".join(parts)
+    
+    def _error_question(self, error_msg: str, difficulty: int, difficulty_name: str) -> Dict:
+        """
+        Build a placeholder question describing a generation failure.
+        """
+        return {
+            "question": f"Error: {error_msg}",
+            "options": {"A": "Option A", "B": "Option B", "C": "Option C", "D": "Option D"},
+            "correct_answer": "A",
+            "explanation": f"Error details: {error_msg}",
+            "topic": "Unknown",
+            "difficulty": difficulty,
+            "difficulty_name": difficulty_name,
+            "error": True,
+            "error_message": error_msg
+        }
 
     def evaluate_answer(
         self, 
@@ -163,14 +542,52 @@ Respond ONLY with a valid JSON object in this exact format (no markdown, no extr
         is_correct = user_answer.upper() == correct_answer.upper()
         
         if is_correct:
-            return {
-                "is_correct": True,
-                "feedback": "Correct! Well done! 🎉",
-                "suggestion": None
-            }
+            return self._correct_feedback()
         
         # Generate helpful feedback for incorrect answers
-        prompt = f"""The student answered a question incorrectly. Provide helpful, encouraging feedback.
+        prompt = self._build_feedback_prompt(question, user_answer, correct_answer, options)
+        
+        try:
+            feedback = self._call_chat(prompt)
+            return self._incorrect_feedback(feedback, correct_answer, options)
+            
+        except Exception as e:
+            return self._incorrect_feedback(None, correct_answer, options)
+    
+    async def aevaluate_answer(
+        self,
+        question: str,
+        user_answer: str,
+        correct_answer: str,
+        options: Dict[str, str],
+        content: str
+    ) -> Dict:
+        """
+        Async counterpart of evaluate_answer, for use with run_concurrently.
+        """
+        if user_answer.upper() == correct_answer.upper():
+            return self._correct_feedback()
+        
+        prompt = self._build_feedback_prompt(question, user_answer, correct_answer, options)
+        
+        try:
+            feedback = await self._acall_chat(prompt)
+            return self._incorrect_feedback(feedback, correct_answer, options)
+            
+        except Exception as e:
+            return self._incorrect_feedback(None, correct_answer, options)
+    
+    def _build_feedback_prompt(
+        self,
+        question: str,
+        user_answer: str,
+        correct_answer: str,
+        options: Dict[str, str]
+    ) -> str:
+        """
+        Build the prompt asking for feedback on an incorrect answer.
+        """
+        return f"""The student answered a question incorrectly. Provide helpful, encouraging feedback.
 
 QUESTION: {question}
 
@@ -182,22 +599,43 @@ Provide a brief, encouraging explanation (2-3 sentences) of:
 2. A tip to remember this concept
 
 Keep it supportive and educational. Do not be discouraging."""
-
-        try:
-            feedback = self._call_chat(prompt)
-            
-            return {
-                "is_correct": False,
-                "feedback": feedback,
-                "suggestion": f"Review the topic related to: {options.get(correct_answer, 'this concept')}"
-            }
-            
-        except Exception as e:
+    
+    def _correct_feedback(self) -> Dict:
+        """
+        Build the evaluation result for a correct answer.
+        """
+        return {
+            "is_correct": True,
+            "feedback": "Correct! Well done! 🎉",
+            "suggestion": None
+        }
+    
+    def _incorrect_feedback(
+        self,
+        feedback: Optional[str],
+        correct_answer: str,
+        options: Dict[str, str]
+    ) -> Dict:
+        """
+        Build the evaluation result for an incorrect answer.
+        
+        Args:
+            feedback: LLM feedback, or None if it could not be generated
+            correct_answer: The correct answer letter
+            options: Dict of all options
+        """
+        if feedback is None:
             return {
                 "is_correct": False,
                 "feedback": f"The correct answer was {correct_answer}: {options.get(correct_answer, '')}",
                 "suggestion": "Review this topic for better understanding."
             }
+        
+        return {
+            "is_correct": False,
+            "feedback": feedback,
+            "suggestion": f"Review the topic related to: {options.get(correct_answer, 'this concept')}"
+        }
     
     def generate_improvement_suggestions(
         self,
@@ -247,38 +685,34 @@ Based on your assessment, here are some general recommendations:
 • Consider revisiting the source material for weak areas
 """
     
-    def _parse_json_response(self, response_text: str) -> Dict:
+    def _parse_json_response(self, response_text: str, decoder: msgspec.json.Decoder):
         """
-        Parse JSON from LLM response, handling potential formatting issues.
+        Parse and validate JSON from LLM response, handling potential formatting issues.
         
         Args:
             response_text: Raw response from LLM
+            decoder: Typed decoder for the expected schema
             
         Returns:
-            Dict: Parsed question data
+            The decoded struct (Question or QuestionBatch)
         """
         # Try to find JSON in the response
         try:
             # First, try direct parsing
-            return json.loads(response_text)
-        except json.JSONDecodeError:
+            return decoder.decode(response_text)
+        except msgspec.DecodeError:
             pass
         
-        # Try to extract JSON from markdown code blocks
-        json_match = re.search(r'```(?:json)?\s*([\s\S]*?)\s*```', response_text)
-        if json_match:
-            try:
-                return json.loads(json_match.group(1))
-            except json.JSONDecodeError:
-                pass
-        
-        # Try to find JSON object pattern
-        json_match = re.search(r'\{[\s\S]*\}', response_text)
-        if json_match:
-            try:
-                return json.loads(json_match.group(0))
-            except json.JSONDecodeError:
-                pass
+        # Fall back to the first complete {...} object, which also covers
+        # JSON wrapped in a markdown code block or surrounded by prose
+        start = response_text.find('{')
+        if start != -1:
+            end = _JsonObjectTracker().feed(response_text[start:])
+            if end != -1:
+                try:
+                    return decoder.decode(response_text[start:start + end])
+                except msgspec.DecodeError:
+                    pass
         
         # Return default structure if parsing fails
         raise ValueError("Could not parse JSON from response")
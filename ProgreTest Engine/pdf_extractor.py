@@ -3,7 +3,25 @@ PDF Text Extraction Module
 Extracts and cleans text content from uploaded PDF files.
 """
 
+import multiprocessing
+import os
+import re
+import tempfile
 import fitz  # PyMuPDF
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+
+# Runs of three or more newlines / two or more spaces
+_MULTI_NEWLINE_RE = re.compile(r'\n{3,}')
+_MULTI_SPACE_RE = re.compile(r' {2,}')
+
+# Documents with at least this many pages are split across worker processes
+_PARALLEL_PAGE_THRESHOLD = 64
+_PAGE_WORKERS = min(os.cpu_count() or 1, 8)
+
+# Lazily created pool for page extraction (PyMuPDF documents are not thread-safe)
+_page_pool = None
 
 
 def extract_text_from_pdf(pdf_file) -> str:
@@ -11,25 +29,44 @@ def extract_text_from_pdf(pdf_file) -> str:
     Extract text content from a PDF file.
     
     Args:
-        pdf_file: Uploaded file object from Streamlit
+        pdf_file: Uploaded file object from Streamlit, or its raw bytes
         
     Returns:
         str: Extracted and cleaned text content
     """
     try:
-        # Read the PDF bytes
-        pdf_bytes = pdf_file.read()
+        # Use raw bytes as-is; only file objects need reading into memory
+        if isinstance(pdf_file, (bytes, bytearray)):
+            pdf_bytes = pdf_file
+        else:
+            pdf_bytes = pdf_file.read()
         
         # Open PDF from bytes
         doc = fitz.open(stream=pdf_bytes, filetype="pdf")
         
-        text_content = []
+        page_count = len(doc)
         
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            text = page.get_text("text")
-            if text.strip():
-                text_content.append(f"--- Page {page_num + 1} ---\n{text}")
+        if page_count < _PARALLEL_PAGE_THRESHOLD:
+            text_content = _extract_page_range(doc, 0, page_count)
+        else:
+            # Each worker opens the document from a temporary file and extracts
+            # a contiguous range, so the PDF is written once instead of being
+            # pickled to every worker
+            step = -(-page_count // _PAGE_WORKERS)
+            starts = range(0, page_count, step)
+            with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+                tmp.write(pdf_bytes)
+            try:
+                text_content = []
+                for part in _get_page_pool().map(
+                    _extract_pages_from_path,
+                    [tmp.name] * len(starts),
+                    starts,
+                    [min(start + step, page_count) for start in starts],
+                ):
+                    text_content.extend(part)
+            finally:
+                os.remove(tmp.name)
         
         doc.close()
         
@@ -44,6 +81,54 @@ def extract_text_from_pdf(pdf_file) -> str:
         raise Exception(f"Error extracting PDF text: {str(e)}")
 
 
+def _extract_page_range(doc, start: int, stop: int) -> List[str]:
+    """
+    Extract the non-empty pages in [start, stop) with their page headers.
+    
+    Args:
+        doc: Open PyMuPDF document
+        start: First page index
+        stop: Page index to stop before
+        
+    Returns:
+        List[str]: One entry per page that has text
+    """
+    text_content = []
+    
+    for page_num in range(start, stop):
+        text = doc[page_num].get_text("text")
+        if text.strip():
+            text_content.append(f"--- Page {page_num + 1} ---\n{text}")
+    
+    return text_content
+
+
+def _extract_pages_from_path(path: str, start: int, stop: int) -> List[str]:
+    """
+    Worker entry point: open the PDF file and extract a page range.
+    """
+    doc = fitz.open(path)
+    try:
+        return _extract_page_range(doc, start, stop)
+    finally:
+        doc.close()
+
+
+def _get_page_pool() -> ProcessPoolExecutor:
+    """
+    Return the shared page extraction pool, creating it on first use.
+    """
+    global _page_pool
+    if _page_pool is None:
+        # Spawn rather than fork: forking the threaded Streamlit server can
+        # copy locks held by other threads into the workers
+        _page_pool = ProcessPoolExecutor(
+            max_workers=_PAGE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _page_pool
+
+
 def clean_text(text: str) -> str:
     """
     Clean extracted text by removing extra whitespace and formatting issues.
@@ -55,11 +140,10 @@ def clean_text(text: str) -> str:
         str: Cleaned text
     """
     # Replace multiple newlines with double newline
-    import re
-    text = re.sub(r'\n{3,}', '\n\n', text)
+    text = _MULTI_NEWLINE_RE.sub('\n\n', text)
     
     # Replace multiple spaces with single space
-    text = re.sub(r' {2,}', ' ', text)
+    text = _MULTI_SPACE_RE.sub(' ', text)
     
     # Remove leading/trailing whitespace from lines
     lines = [line.strip() for line in text.split('\n')]
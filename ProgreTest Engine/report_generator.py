@@ -11,11 +11,83 @@ from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, Tabl
 from reportlab.graphics.shapes import Drawing, Line
 from reportlab.graphics.charts.barcharts import VerticalBarChart
 from reportlab.graphics.charts.piecharts import Pie
+from collections import Counter
 from io import BytesIO
 from datetime import datetime
 from typing import Dict, List
 
 
+# Difficulty level names
+DIFF_NAMES = {1: 'Easy', 2: 'Medium', 3: 'Hard'}
+
+# Paragraph styles, built once and shared by every report (never mutated)
+_styles = getSampleStyleSheet()
+
+TITLE_STYLE = ParagraphStyle(
+    'CustomTitle',
+    parent=_styles['Heading1'],
+    fontSize=24,
+    spaceAfter=30,
+    textColor=colors.HexColor('#1a365d'),
+    alignment=1  # Center
+)
+
+HEADING_STYLE = ParagraphStyle(
+    'CustomHeading',
+    parent=_styles['Heading2'],
+    fontSize=16,
+    spaceBefore=20,
+    spaceAfter=12,
+    textColor=colors.HexColor('#2c5282')
+)
+
+SUBHEADING_STYLE = ParagraphStyle(
+    'CustomSubheading',
+    parent=_styles['Heading3'],
+    fontSize=12,
+    spaceBefore=15,
+    spaceAfter=8,
+    textColor=colors.HexColor('#4a5568')
+)
+
+NORMAL_STYLE = ParagraphStyle(
+    'CustomNormal',
+    parent=_styles['Normal'],
+    fontSize=10,
+    spaceAfter=8,
+    leading=14
+)
+
+DATE_STYLE = ParagraphStyle('Date', parent=NORMAL_STYLE, alignment=1, textColor=colors.gray)
+
+FOOTER_STYLE = ParagraphStyle(
+    'Footer',
+    parent=NORMAL_STYLE,
+    alignment=1,
+    textColor=colors.gray,
+    fontSize=9
+)
+
+# Overall grade label -> its colored heading style
+GRADE_STYLES = {
+    grade: ParagraphStyle(
+        'Grade',
+        parent=_styles['Heading2'],
+        fontSize=14,
+        alignment=1,
+        textColor=colors.HexColor(grade_color),
+        spaceBefore=10,
+        spaceAfter=20
+    )
+    for grade, grade_color in (
+        ("🌟 Excellent", '#38a169'),
+        ("👍 Good", '#3182ce'),
+        ("📈 Satisfactory", '#d69e2e'),
+        ("📚 Needs Improvement", '#e53e3e'),
+    )
+}
+
+
 def generate_assessment_report(
     performance_data: Dict,
     questions_history: List[Dict],
@@ -44,57 +116,19 @@ def generate_assessment_report(
         bottomMargin=72
     )
     
-    # Styles
-    styles = getSampleStyleSheet()
-    
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        spaceAfter=30,
-        textColor=colors.HexColor('#1a365d'),
-        alignment=1  # Center
-    )
-    
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=16,
-        spaceBefore=20,
-        spaceAfter=12,
-        textColor=colors.HexColor('#2c5282')
-    )
-    
-    subheading_style = ParagraphStyle(
-        'CustomSubheading',
-        parent=styles['Heading3'],
-        fontSize=12,
-        spaceBefore=15,
-        spaceAfter=8,
-        textColor=colors.HexColor('#4a5568')
-    )
-    
-    normal_style = ParagraphStyle(
-        'CustomNormal',
-        parent=styles['Normal'],
-        fontSize=10,
-        spaceAfter=8,
-        leading=14
-    )
-    
     # Build content
     story = []
     
     # Title
-    story.append(Paragraph("📚 Adaptive Assessment Report", title_style))
+    story.append(Paragraph("📚 Adaptive Assessment Report", TITLE_STYLE))
     story.append(Paragraph(
         f"Generated on: {datetime.now().strftime('%B %d, %Y at %I:%M %p')}",
-        ParagraphStyle('Date', parent=normal_style, alignment=1, textColor=colors.gray)
+        DATE_STYLE
     ))
     story.append(Spacer(1, 30))
     
     # Performance Summary Section
-    story.append(Paragraph("📊 Performance Summary", heading_style))
+    story.append(Paragraph("📊 Performance Summary", HEADING_STYLE))
     
     # Create performance metrics table
     total_q = performance_data.get('total_questions', 0)
@@ -104,17 +138,14 @@ def generate_assessment_report(
     avg_diff = performance_data.get('avg_difficulty', 1)
     max_diff = performance_data.get('max_difficulty_reached', 1)
     
-    # Difficulty level names
-    diff_names = {1: 'Easy', 2: 'Medium', 3: 'Hard'}
-    
     metrics_data = [
         ['Metric', 'Value'],
         ['Total Questions Attempted', str(total_q)],
         ['Correct Answers', f'{correct} ✓'],
         ['Incorrect Answers', f'{incorrect} ✗'],
         ['Accuracy Rate', f'{accuracy:.1f}%'],
-        ['Average Difficulty', f'{avg_diff:.1f}/3 ({diff_names.get(round(avg_diff), "Medium")})'],
-        ['Highest Difficulty Reached', f'{diff_names.get(max_diff, "Easy")}'],
+        ['Average Difficulty', f'{avg_diff:.1f}/3 ({DIFF_NAMES.get(round(avg_diff), "Medium")})'],
+        ['Highest Difficulty Reached', f'{DIFF_NAMES.get(max_diff, "Easy")}'],
     ]
     
     metrics_table = Table(metrics_data, colWidths=[3*inch, 2*inch])
@@ -140,41 +171,32 @@ def generate_assessment_report(
     # Performance Grade
     if accuracy >= 90:
         grade = "🌟 Excellent"
-        grade_color = '#38a169'
     elif accuracy >= 75:
         grade = "👍 Good"
-        grade_color = '#3182ce'
     elif accuracy >= 60:
         grade = "📈 Satisfactory"
-        grade_color = '#d69e2e'
     else:
         grade = "📚 Needs Improvement"
-        grade_color = '#e53e3e'
     
-    grade_style = ParagraphStyle(
-        'Grade',
-        parent=styles['Heading2'],
-        fontSize=14,
-        alignment=1,
-        textColor=colors.HexColor(grade_color),
-        spaceBefore=10,
-        spaceAfter=20
-    )
-    story.append(Paragraph(f"Overall Grade: {grade}", grade_style))
+    story.append(Paragraph(f"Overall Grade: {grade}", GRADE_STYLES[grade]))
     
     # Topic Performance Section
-    story.append(Paragraph("📝 Question-by-Question Analysis", heading_style))
+    story.append(Paragraph("📝 Question-by-Question Analysis", HEADING_STYLE))
+    
+    # Build the question table rows and incorrect-answer counts per topic in one pass
+    q_data = [['#', 'Topic', 'Difficulty', 'Result']]
+    topic_counts = Counter()
+    
+    for i, q in enumerate(questions_history, 1):
+        is_correct = q.get('is_correct', False)
+        if not is_correct:
+            topic_counts[q.get('topic', 'Unknown')] += 1
+        topic = q.get('topic', 'General')[:30]
+        diff = DIFF_NAMES.get(q.get('difficulty', 1), 'Medium')
+        result = '✓ Correct' if is_correct else '✗ Incorrect'
+        q_data.append([str(i), topic, diff, result])
     
     if questions_history:
-        # Build question analysis table
-        q_data = [['#', 'Topic', 'Difficulty', 'Result']]
-        
-        for i, q in enumerate(questions_history, 1):
-            topic = q.get('topic', 'General')[:30]
-            diff = diff_names.get(q.get('difficulty', 1), 'Medium')
-            result = '✓ Correct' if q.get('is_correct', False) else '✗ Incorrect'
-            q_data.append([str(i), topic, diff, result])
-        
         q_table = Table(q_data, colWidths=[0.5*inch, 2.5*inch, 1*inch, 1*inch])
         q_table.setStyle(TableStyle([
             ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4a5568')),
@@ -190,31 +212,24 @@ def generate_assessment_report(
         
         story.append(q_table)
     else:
-        story.append(Paragraph("No questions answered yet.", normal_style))
+        story.append(Paragraph("No questions answered yet.", NORMAL_STYLE))
     
     story.append(Spacer(1, 20))
     
     # Weak Topics Section
-    weak_topics = [q.get('topic', 'Unknown') for q in questions_history if not q.get('is_correct', False)]
-    
-    if weak_topics:
-        story.append(Paragraph("⚠️ Topics Needing Review", heading_style))
-        
-        # Count topic occurrences
-        topic_counts = {}
-        for topic in weak_topics:
-            topic_counts[topic] = topic_counts.get(topic, 0) + 1
+    if topic_counts:
+        story.append(Paragraph("⚠️ Topics Needing Review", HEADING_STYLE))
         
-        for topic, count in sorted(topic_counts.items(), key=lambda x: -x[1]):
+        for topic, count in topic_counts.most_common():
             story.append(Paragraph(
                 f"• <b>{topic}</b> - {count} incorrect answer(s)",
-                normal_style
+                NORMAL_STYLE
             ))
         
         story.append(Spacer(1, 15))
     
     # Improvement Suggestions Section
-    story.append(Paragraph("💡 Personalized Recommendations", heading_style))
+    story.append(Paragraph("💡 Personalized Recommendations", HEADING_STYLE))
     
     # Process suggestions - split by lines and bullet points
     suggestions_lines = improvement_suggestions.strip().split('\n')
@@ -225,26 +240,19 @@ def generate_assessment_report(
             line = line.replace('**', '').replace('*', '')
             line = line.replace('•', '').replace('-', '', 1).strip()
             if line:
-                story.append(Paragraph(f"• {line}", normal_style))
+                story.append(Paragraph(f"• {line}", NORMAL_STYLE))
     
     story.append(Spacer(1, 30))
     
     # Footer
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=normal_style,
-        alignment=1,
-        textColor=colors.gray,
-        fontSize=9
-    )
-    story.append(Paragraph("─" * 50, footer_style))
+    story.append(Paragraph("─" * 50, FOOTER_STYLE))
     story.append(Paragraph(
         "Generated by Quick Learn - Adaptive Assessment Platform",
-        footer_style
+        FOOTER_STYLE
     ))
     story.append(Paragraph(
         "Keep learning, keep growing! 🚀",
-        footer_style
+        FOOTER_STYLE
     ))
     
     # Build PDF
@@ -266,10 +274,7 @@ def get_weak_topics(questions_history: List[Dict]) -> List[str]:
     Returns:
         List of weak topic names
     """
-    weak_topics = []
-    for q in questions_history:
-        if not q.get('is_correct', False):
-            topic = q.get('topic', 'Unknown')
-            if topic not in weak_topics:
-                weak_topics.append(topic)
-    return weak_topics
+    # dict keys dedupe in O(1) per topic while keeping first-seen order
+    return list(dict.fromkeys(
+        q.get('topic', 'Unknown') for q in questions_history if not q.get('is_correct', False)
+    ))
@@ -0,0 +1,9 @@
+# Worker side of SnapLearn's page extraction pool. Kept free of app imports
+# so spawned workers load only pypdf, not Chroma, Cohere or the cache.
+from pypdf import PdfReader
+
+
+def extract_pages(path, start, stop):
+    # Opened per call and not kept: the file is deleted once extraction ends
+    reader = PdfReader(path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
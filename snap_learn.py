@@ -1,65 +1,355 @@
-import json
+import asyncio
+import hashlib
+import orjson
 import cohere
+import diskcache
+import httpx
+import io
+import logging
+import multiprocessing
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from fastapi import APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pypdf import PdfReader
 from fpdf import FPDF
 from database import get_collection
+from pdf_pages import extract_pages
 import os
 COHERE_API_KEY = os.getenv("COHERE_API_KEY")
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/snaplearn")
-collection = get_collection("snaplearn")
-
-co = cohere.Client(COHERE_API_KEY)
-def llm(prompt, max_tokens=1000):
-    r = co.chat(
-        model="command-a-vision-07-2025",
-        message=prompt,
-        temperature=0.3,
-        max_tokens=max_tokens
+# Chunks are embedded with Cohere, so they cannot share a collection with
+# vectors from Chroma's default embedder (different dimension)
+collection = get_collection("snaplearn_cohere")
+
+# One pooled HTTP/2 connection set, shared by every request
+co_async = cohere.AsyncClient(
+    COHERE_API_KEY,
+    httpx_client=httpx.AsyncClient(
+        http2=True,
+        timeout=60,
+        limits=httpx.Limits(max_keepalive_connections=32, max_connections=64)
     )
-    t = r.text.strip()
+)
+MODEL = "command-a-vision-07-2025"
+llm_cache = diskcache.Cache("./.llm_cache")
+EMBED_MODEL = "embed-english-v3.0"
+EMBED_BATCH_SIZE = 96
+MCQ_COUNT = 10
+CHUNK_SIZE = 900
+CHUNK_OVERLAP = 100
+# pypdf is pure Python, so large PDFs are split across processes, not threads
+PARALLEL_PAGE_THRESHOLD = 32
+PAGE_WORKERS = min(os.cpu_count() or 1, 8)
+page_pool = None
+
+REVISE_TEMPLATE = """You are an academic tutor. Return STRICT JSON only, with no markdown or text outside it.
+
+From the TEXT below:
+1. Extract ALL key concepts, each with a multi-sentence exam revision explanation based ONLY on the text.
+2. List any formulas.
+3. Write EXACTLY 10 MCQs from the text, each with exactly 4 options.
+
+JSON FORMAT:
+{{"key_concepts":[{{"concept":"...","explanation":"..."}}],"formulas":["..."],"mcqs":[{{"question":"...","options":["A) ...","B) ...","C) ...","D) ..."],"correctAnswer":"A"}}]}}
+
+TEXT:
+{context}
+"""
+
+
+@router.on_event("startup")
+async def log_prompt_budget():
+    # Fixed prompt overhead billed on every /revise call, before the chunk text
+    try:
+        r = await co_async.tokenize(text=REVISE_TEMPLATE.format(context=""), model=MODEL)
+        logger.info("revise prompt template: %d tokens", len(r.tokens))
+    except Exception as e:
+        logger.warning("Could not tokenize revise prompt template: %s", e)
+
+
+def cache_key(prompt, max_tokens):
+    return hashlib.sha256(f"{MODEL}:{max_tokens}:{prompt}".encode()).hexdigest()
+
+
+def mcq_end(text, n):
+    # Index just past the object holding the nth "correctAnswer", or -1
+    i = -1
+    for _ in range(n):
+        i = text.find('"correctAnswer"', i + 1)
+        if i < 0:
+            return -1
+    end = text.find("}", i)
+    return end + 1 if end >= 0 else -1
+
+
+def salvage_mcqs(text):
+    # Close the JSON after the last complete MCQ ("mcqs" is the last key)
+    for n in range(text.count('"correctAnswer"'), 0, -1):
+        end = mcq_end(text, n)
+        if end >= 0:
+            return text[:end] + "]}"
+    return None
+
+
+async def allm(prompt, max_tokens=1000, mcqs=None):
+    key = cache_key(prompt, max_tokens)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        return cached
+    if mcqs is None:
+        r = await co_async.chat(
+            model=MODEL,
+            message=prompt,
+            temperature=0.3,
+            max_tokens=max_tokens
+        )
+        t = r.text.strip()
+    else:
+        # Stream and stop as soon as the requested number of MCQs is complete
+        parts = []
+        stream = co_async.chat_stream(
+            model=MODEL,
+            message=prompt,
+            temperature=0.3,
+            max_tokens=max_tokens
+        )
+        try:
+            async for event in stream:
+                if event.event_type != "text-generation":
+                    continue
+                parts.append(event.text)
+                if "}" in event.text:
+                    text = "".join(parts)
+                    end = mcq_end(text, mcqs)
+                    if end >= 0:
+                        parts = [text[:end], "]}"]
+                        break
+        finally:
+            await stream.aclose()
+        t = "".join(parts).strip()
     if not t:
         raise HTTPException(500, "AI returned empty response")
+    llm_cache[key] = t
     return t
 
 
+async def aembed(texts, input_type):
+    batches = [texts[i:i + EMBED_BATCH_SIZE] for i in range(0, len(texts), EMBED_BATCH_SIZE)]
+    results = await asyncio.gather(*(
+        co_async.embed(texts=b, model=EMBED_MODEL, input_type=input_type)
+        for b in batches
+    ))
+    return [e for r in results for e in r.embeddings]
+
+
+
+
+FONT_DIR = os.getenv("SNAPLEARN_FONT_DIR", "/usr/share/fonts/truetype/dejavu")
+UNICODE_FONT = os.path.isfile(os.path.join(FONT_DIR, "DejaVuSans.ttf")) and \
+    os.path.isfile(os.path.join(FONT_DIR, "DejaVuSans-Bold.ttf"))
+FONT = "DejaVu" if UNICODE_FONT else "Arial"
 
 
 class PDF(FPDF):
+    def __init__(self):
+        super().__init__()
+        if UNICODE_FONT:
+            self.add_font(FONT, "", os.path.join(FONT_DIR, "DejaVuSans.ttf"))
+            self.add_font(FONT, "B", os.path.join(FONT_DIR, "DejaVuSans-Bold.ttf"))
+
     def header(self):
-        self.set_font("Arial", "B", 14)
+        self.set_font(FONT, "B", 14)
         self.cell(0, 10, "SnapLearn Quick Revision Guide", ln=True, align="C")
         self.ln(4)
 
+def get_page_pool():
+    # Spawned on first use, not forked from the threaded server process
+    global page_pool
+    if page_pool is None:
+        page_pool = ProcessPoolExecutor(
+            max_workers=PAGE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return page_pool
+
+
+@router.on_event("shutdown")
+def shutdown_page_pool():
+    if page_pool is not None:
+        page_pool.shutdown(cancel_futures=True)
+
+
+def spool_to_path(f):
+    # Workers open the PDF by path, so it is written to disk once, not sent per task
+    f.seek(0)
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        shutil.copyfileobj(f, tmp)
+    return tmp.name
+
+
+def file_hash(f):
+    # Hash the spooled upload in blocks, then rewind it for extraction
+    h = hashlib.blake2b(digest_size=16)
+    for block in iter(lambda: f.read(1 << 20), b""):
+        h.update(block)
+    f.seek(0)
+    return h.hexdigest()
+
+
+async def extract_text(f):
+    reader = PdfReader(f)
+    n = len(reader.pages)
+    if n < PARALLEL_PAGE_THRESHOLD:
+        return await run_in_threadpool(
+            lambda: "".join([p.extract_text() or "" for p in reader.pages])
+        )
+    path = await run_in_threadpool(spool_to_path, f)
+    try:
+        step = -(-n // PAGE_WORKERS)
+        pool = get_page_pool()
+        loop = asyncio.get_running_loop()
+        parts = await asyncio.gather(*(
+            loop.run_in_executor(pool, extract_pages, path, i, min(i + step, n))
+            for i in range(0, n, step)
+        ))
+    finally:
+        os.remove(path)
+    return "".join([t for part in parts for t in part])
+
+
+def extract_json(s):
+    try:
+        return orjson.loads(s)
+    except orjson.JSONDecodeError:
+        pass
+    # Single pass over the first {...} object, ignoring braces inside strings
+    start = s.find("{")
+    if start < 0:
+        raise ValueError("No JSON object in response")
+    depth = 0
+    in_str = False
+    esc = False
+    for j in range(start, len(s)):
+        c = s[j]
+        if in_str:
+            if esc:
+                esc = False
+            elif c == "\\":
+                esc = True
+            elif c == '"':
+                in_str = False
+        elif c == '"':
+            in_str = True
+        elif c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                return orjson.loads(s[start:j + 1])
+    raise ValueError("No JSON object in response")
+
 def clean(t):
+    # The TTF font renders any Unicode text; core fonts only cover latin-1
+    if UNICODE_FONT:
+        return t
     return t.encode("latin-1", "replace").decode("latin-1")
 
+def valid_mcq_sheet(mcqs):
+    # build_pdf() indexes every one of these fields
+    if not isinstance(mcqs, dict) or not isinstance(mcqs.get("q"), list) or not mcqs["q"]:
+        return False
+    return all(
+        isinstance(q, dict)
+        and "id" in q and "a" in q
+        and isinstance(q.get("q"), str)
+        and isinstance(q.get("o"), list)
+        and all(isinstance(o, str) for o in q["o"])
+        for q in mcqs["q"]
+    )
+
+
+def build_pdf(concepts, formulas, mcqs):
+    pdf = PDF()
+    pdf.add_page()
+    pdf.set_font(FONT, size=11)
+    pdf.multi_cell(0, 8, clean(concepts))
+
+    pdf.add_page()
+    pdf.multi_cell(0, 8, clean(formulas))
+
+    pdf.add_page()
+    answers = []
+    for q in mcqs["q"]:
+        pdf.multi_cell(0, 8, clean(f"Q{q['id']}. {q['q']}"))
+        for o in q["o"]:
+            pdf.cell(10)
+            pdf.cell(0, 8, clean(o), ln=True)
+        answers.append(f"{q['id']}:{q['a']}")
+
+    pdf.add_page()
+    pdf.multi_cell(0, 8, " ".join(answers))
+
+    # fpdf2 returns the document as a bytearray when no file name is given
+    return pdf.output()
+
+
 @router.post("/upload")
 async def upload(file: UploadFile = File(...)):
-    reader = PdfReader(file.file)
-    text = ""
-    for p in reader.pages:
-        text += p.extract_text() or ""
+    h = await run_in_threadpool(file_hash, file.file)
+    existing = collection.get(where={"hash": h}, include=["documents", "metadatas"])
+    if existing["ids"]:
+        # Same PDF already chunked and embedded, possibly under another name
+        stored = sorted(zip(existing["metadatas"], existing["ids"], existing["documents"]),
+                        key=lambda x: x[0]["chunk"])
+        return {
+            "cached": True,
+            "document": stored[0][0]["doc"],
+            "hash": h,
+            "total_chunks": len(stored),
+            "chunks": [{"id": cid, "text": c[:60] + "..."} for _, cid, c in stored]
+        }
+
+    text = await extract_text(file.file)
     if len(text.strip()) < 100:
         raise HTTPException(400, "No readable text")
-    chunks = [text[i:i+900] for i in range(0, len(text), 800)]
-    ids = [f"{file.filename}_{i}" for i in range(len(chunks))]
-    collection.add(
+    # Stop before a start whose window would fall inside the previous chunk's overlap
+    starts = range(0, max(len(text) - CHUNK_OVERLAP, 1), CHUNK_SIZE - CHUNK_OVERLAP)
+    chunks = []
+    ids = []
+    previews = []
+    for n, i in enumerate(starts):
+        c = text[i:i + CHUNK_SIZE]
+        cid = f"{file.filename}_{n}"
+        chunks.append(c)
+        ids.append(cid)
+        previews.append({"id": cid, "text": c[:60] + "..."})
+    embeddings = await aembed(chunks, "search_document")
+    # Upsert so re-uploading a file name replaces its chunks instead of colliding on ids
+    collection.upsert(
         documents=chunks,
         ids=ids,
-        metadatas=[{"doc": file.filename}] * len(chunks)
+        embeddings=embeddings,
+        metadatas=[{"doc": file.filename, "hash": h, "chunk": n} for n in range(len(chunks))]
     )
+    # Drop leftover chunks from an earlier, longer version of the same file
+    collection.delete(where={"$and": [{"doc": file.filename}, {"hash": {"$ne": h}}]})
     return {
+        "cached": False,
         "document": file.filename,
+        "hash": h,
         "total_chunks": len(chunks),
-        "chunks": [{"id": ids[i], "text": chunks[i][:60] + "..."} for i in range(len(chunks))]
+        "chunks": previews
     }
 
 @router.get("/accuracy-check")
 async def accuracy(query: str):
-    r = collection.query(query_texts=[query], n_results=3)
+    embeddings = await aembed([query], "search_query")
+    r = collection.query(query_embeddings=embeddings, n_results=3)
     return {
         "ids": r["ids"][0],
         "text_found": r["documents"][0],
@@ -74,77 +364,52 @@ async def revise(chunk_id: str):
 
     context = d["documents"][0][:1400]
 
-    prompt = f"""
-You are an academic tutor.
+    prompt = REVISE_TEMPLATE.format(context=context)
 
-Return STRICT JSON only.
-
-TASKS:
-1. Extract ALL key concepts from the text.
-2. Explain each concept clearly for exam revision.
-3. Extract formulas if present.
-4. Generate EXACTLY 10 MCQs strictly from this text.
-
-JSON FORMAT:
-{{
-  "key_concepts": [
-    {{
-      "concept": "Concept title",
-      "explanation": "Detailed explanation derived ONLY from the given text"
-    }}
-  ],
-  "formulas": ["formula1","formula2"],
-  "mcqs": [
-    {{
-      "question": "Question text",
-      "options": ["A) option","B) option","C) option","D) option"],
-      "correctAnswer": "A"
-    }}
-  ]
-}}
-
-RULES:
-- key_concepts MUST include ALL important ideas from the text
-- explanation MUST be multi-sentence, not one-line
-- mcqs MUST be exactly 10
-- options MUST be exactly 4
-- No markdown
-- No extra text outside JSON
-
-TEXT:
-{context}
-"""
-
-    raw = llm(prompt, max_tokens=1800)
+    raw = await allm(prompt, max_tokens=1800, mcqs=MCQ_COUNT)
 
     try:
-        parsed = json.loads(raw)
-    except Exception:
-        raise HTTPException(500, f"Invalid JSON from AI:\n{raw}")
+        parsed = extract_json(raw)
+    except ValueError:
+        # Output cut off by max_tokens still holds the MCQs completed so far
+        partial = salvage_mcqs(raw)
+        try:
+            parsed = extract_json(partial) if partial else None
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            llm_cache.delete(cache_key(prompt, 1800))
+            raise HTTPException(500, f"Invalid JSON from AI:\n{raw}")
+
+    if not isinstance(parsed, dict):
+        llm_cache.delete(cache_key(prompt, 1800))
+        raise HTTPException(500, "AI response is not a JSON object")
 
     if "key_concepts" not in parsed or not parsed["key_concepts"]:
+        llm_cache.delete(cache_key(prompt, 1800))
         raise HTTPException(500, "No key concepts generated")
 
     mcqs = parsed.get("mcqs", [])
-    if len(mcqs) < 10:
-        raise HTTPException(500, f"AI returned only {len(mcqs)} MCQs")
-
-    parsed["mcqs"] = mcqs[:10]
+    if not isinstance(mcqs, list) or not mcqs:
+        llm_cache.delete(cache_key(prompt, 1800))
+        raise HTTPException(500, "AI returned no MCQs")
+    if len(mcqs) < MCQ_COUNT:
+        # Serve the partial set, but let the next request try for a full one
+        llm_cache.delete(cache_key(prompt, 1800))
+
+    parsed["mcqs"] = mcqs[:MCQ_COUNT]
     return {"analysis": parsed}
 
 
 @router.get("/generate-quick-pdf/{doc}")
 async def generate(doc: str):
-    r = collection.get(where={"doc": doc})
+    r = collection.get(where={"doc": doc}, limit=5, include=["documents"])
     if not r["documents"]:
         raise HTTPException(404)
 
-    context = " ".join(r["documents"][:5])[:2500]
-
-    concepts = llm(f"Extract all key concepts for last minute exam revision:\n{context}")
-    formulas = llm(f"Extract all formulas or symbols:\n{context}")
+    context = " ".join(r["documents"])[:2500]
 
-    mcq_raw = llm(f"""
+    mcq_prompt = f"""
     Return STRICT JSON only.
     Do not include explanations.
     Do not include markdown.
@@ -166,38 +431,28 @@ async def generate(doc: str):
 
     TEXT:
     {context}
-    """, max_tokens=1500)
-
-    try:
-        mcqs = json.loads(mcq_raw)
-    except json.JSONDecodeError:
-        cleaned = mcq_raw.strip()
-        cleaned = cleaned[cleaned.find("{"):cleaned.rfind("}") + 1]
-        try:
-            mcqs = json.loads(cleaned)
-        except Exception:
-            raise HTTPException(500, f"Invalid MCQ JSON from AI:\n{mcq_raw}")
+    """
 
-    pdf = PDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=11)
-    pdf.multi_cell(0, 8, clean(concepts))
-
-    pdf.add_page()
-    pdf.multi_cell(0, 8, clean(formulas))
-
-    pdf.add_page()
-    answers = []
-    for q in mcqs["q"]:
-        pdf.multi_cell(0, 8, f"Q{q['id']}. {q['q']}")
-        for o in q["o"]:
-            pdf.cell(10)
-            pdf.cell(0, 8, clean(o), ln=True)
-        answers.append(f"{q['id']}:{q['a']}")
-
-    pdf.add_page()
-    pdf.multi_cell(0, 8, " ".join(answers))
+    concepts, formulas, mcq_raw = await asyncio.gather(
+        allm(f"Extract all key concepts for last minute exam revision:\n{context}"),
+        allm(f"Extract all formulas or symbols:\n{context}"),
+        allm(mcq_prompt, max_tokens=1500)
+    )
 
-    name = f"SnapLearn_{doc}.pdf"
-    pdf.output(name)
-    return FileResponse(name, filename=name)
+    try:
+        mcqs = extract_json(mcq_raw)
+    except ValueError:
+        llm_cache.delete(cache_key(mcq_prompt, 1500))
+        raise HTTPException(500, f"Invalid MCQ JSON from AI:\n{mcq_raw}")
+
+    if not valid_mcq_sheet(mcqs):
+        llm_cache.delete(cache_key(mcq_prompt, 1500))
+        raise HTTPException(500, f"Malformed MCQs from AI:\n{mcq_raw}")
+
+    # Layout is CPU-bound, so render in the threadpool to keep the event loop free
+    buf = io.BytesIO(await run_in_threadpool(build_pdf, concepts, formulas, mcqs))
+    return StreamingResponse(
+        buf,
+        media_type="application/pdf",
+        headers={"Content-Disposition": f'attachment; filename="SnapLearn_{doc}.pdf"'}
+    )